@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
 import os
+import io
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import Counter
 import discord
 from discord.ext import commands
 from discord import app_commands
@@ -7,7 +14,7 @@ from datetime import datetime, timezone, timedelta
 import aiosqlite
 from flask import Flask
 from threading import Thread
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 # ======================================
 # Config / Timezone
@@ -56,6 +63,13 @@ async def setup_database():
                 notes TEXT
             )
         ''')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS dashboards (
+                guild_id INTEGER PRIMARY KEY,
+                channel_id INTEGER,
+                message_id INTEGER
+            )
+        ''')
         await db.commit()
 
 
@@ -363,6 +377,7 @@ async def clear_user_report(ctx, user: discord.Member):
 
         await db.execute('DELETE FROM time_entries WHERE user_id = ?', (user.id,))
         await db.commit()
+        _presence_track(user, 'saida', datetime.now(BRAZIL_TZ))
 
         msg = (
             f"**Usuário:** {user.mention} (**{_user_nick(user)}**)\n"
@@ -452,6 +467,162 @@ async def painel(ctx):
     await ctx.send("🧭 **Painel de Ponto** — use os botões abaixo:", view=view)
 
 
+# ======================================
+# Quadro de presença ("quem está de plantão"), atualizado por eventos
+# ======================================
+QUADRO_DEBOUNCE = 5.0  # segundos agrupando eventos antes de editar a mensagem
+
+_presence: Dict[int, Tuple[str, datetime]] = {}   # user_id -> (último evento, início da jornada)
+_dashboards: Dict[int, Tuple[int, int]] = {}      # guild_id -> (channel_id, message_id)
+_dashboard_tasks: Dict[int, asyncio.Task] = {}
+
+
+async def _presence_load():
+    """Reconstrói o estado em memória a partir do último registro de cada usuário."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        # Início da jornada = última 'entrada' até o último registro (pausa/retorno não reiniciam)
+        cursor = await db.execute(
+            '''
+            SELECT t.user_id, t.entry_type, COALESCE((
+                SELECT MAX(e.timestamp) FROM time_entries e
+                WHERE e.user_id = t.user_id AND e.entry_type = 'entrada' AND e.timestamp <= t.timestamp
+            ), t.timestamp)
+            FROM time_entries t
+            JOIN (SELECT user_id, MAX(timestamp) AS ts FROM time_entries GROUP BY user_id) last
+              ON t.user_id = last.user_id AND t.timestamp = last.ts
+            WHERE t.entry_type != 'saida'
+            ''')
+        rows = await cursor.fetchall()
+        cursor = await db.execute('SELECT guild_id, channel_id, message_id FROM dashboards')
+        boards = await cursor.fetchall()
+
+    _presence.clear()
+    for user_id, entry_type, ts in rows:
+        _presence[user_id] = (entry_type, _parse_timestamp_to_brazil_tz(ts))
+    _dashboards.clear()
+    for guild_id, channel_id, message_id in boards:
+        _dashboards[guild_id] = (channel_id, message_id)
+
+
+def _presence_track(member: discord.abc.User, entry_type: str, when: datetime):
+    """Aplica um evento de ponto ao estado em memória e agenda a edição dos quadros."""
+    if entry_type == 'saida':
+        if _presence.pop(member.id, None) is None:
+            return
+    elif entry_type == 'entrada' or member.id not in _presence:
+        _presence[member.id] = (entry_type, when)
+    else:
+        # pausa/retorno mudam só o estado; "desde" continua sendo a entrada
+        _presence[member.id] = (entry_type, _presence[member.id][1])
+
+    for guild_id in _dashboards:
+        guild = bot.get_guild(guild_id)
+        if guild and guild.get_member(member.id):
+            _schedule_dashboard(guild_id)
+
+
+def _schedule_dashboard(guild_id: int, delay: float = QUADRO_DEBOUNCE):
+    task = _dashboard_tasks.get(guild_id)
+    if task and not task.done():
+        return  # já existe uma edição pendente que vai incluir este evento
+    _dashboard_tasks[guild_id] = asyncio.create_task(_refresh_dashboard(guild_id, delay))
+
+
+def _make_dashboard_embed(guild: discord.Guild) -> discord.Embed:
+    ativos: List[Tuple[datetime, str]] = []
+    pausados: List[Tuple[datetime, str]] = []
+    for user_id, (entry_type, since) in _presence.items():
+        member = guild.get_member(user_id)
+        if member is None:
+            continue
+        line = f"{member.mention} — desde <t:{int(since.timestamp())}:R>"
+        (pausados if entry_type == 'pausa' else ativos).append((since, line))
+
+    def _field_value(items: List[Tuple[datetime, str]]) -> str:
+        if not items:
+            return '—'
+        lines = [line for _, line in sorted(items)]
+        value = ''
+        for i, line in enumerate(lines):
+            extra = f"\n… e mais {len(lines) - i}"
+            if len(value) + len(line) + 1 + len(extra) > 1024:
+                return value + extra
+            value += ('\n' if value else '') + line
+        return value
+
+    e = discord.Embed(
+        title="👥 Quem está de plantão",
+        color=0x16A085,
+        timestamp=datetime.now(BRAZIL_TZ)
+    )
+    e.add_field(name=f"🟢 Em jornada ({len(ativos)})", value=_field_value(ativos), inline=False)
+    e.add_field(name=f"⏸️ Em pausa ({len(pausados)})", value=_field_value(pausados), inline=False)
+    e.set_footer(text="Atualizado automaticamente a cada registro de ponto.")
+    return e
+
+
+async def _refresh_dashboard(guild_id: int, delay: float):
+    await asyncio.sleep(delay)
+    # Sai da lista antes de editar: eventos durante a edição agendam uma nova
+    _dashboard_tasks.pop(guild_id, None)
+
+    board = _dashboards.get(guild_id)
+    guild = bot.get_guild(guild_id)
+    if not board or not guild:
+        return
+    channel = guild.get_channel_or_thread(board[0])
+    if channel is None:
+        print(f"[QUADRO] Canal do quadro removido na guild {guild_id}; quadro desativado.")
+        await _drop_dashboard(guild_id)
+        return
+
+    try:
+        await channel.get_partial_message(board[1]).edit(content=None, embed=_make_dashboard_embed(guild))
+    except discord.NotFound:
+        print(f"[QUADRO] Mensagem do quadro removida na guild {guild_id}; quadro desativado.")
+        await _drop_dashboard(guild_id)
+    except discord.HTTPException as e:
+        print(f"[ERRO] Ao atualizar quadro da guild {guild_id}: {e}")
+
+
+async def _drop_dashboard(guild_id: int):
+    _dashboards.pop(guild_id, None)
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.execute('DELETE FROM dashboards WHERE guild_id = ?', (guild_id,))
+        await db.commit()
+
+
+async def _post_dashboard(channel: discord.abc.GuildChannel) -> discord.Message:
+    guild = channel.guild
+    old = _dashboards.get(guild.id)
+    msg = await channel.send(embed=_make_dashboard_embed(guild))
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.execute(
+            'INSERT OR REPLACE INTO dashboards (guild_id, channel_id, message_id) VALUES (?, ?, ?)',
+            (guild.id, channel.id, msg.id))
+        await db.commit()
+    _dashboards[guild.id] = (channel.id, msg.id)
+
+    # Remove o quadro anterior para não deixar uma lista desatualizada visível
+    old_channel = guild.get_channel_or_thread(old[0]) if old else None
+    if old_channel is not None:
+        try:
+            await old_channel.get_partial_message(old[1]).delete()
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            print(f"[ERRO] Ao remover quadro antigo da guild {guild.id}: {e}")
+    return msg
+
+
+@bot.command(name='quadro')
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def quadro(ctx):
+    """Publica (ou move para este canal) o quadro de quem está de plantão."""
+    await _post_dashboard(ctx.channel)
+
+
 # ======================================
 # Implementações das ações (compartilhadas)
 # ======================================
@@ -475,6 +646,7 @@ async def _handle_entrada(ctx, notes: Optional[str]):
             'INSERT INTO time_entries (user_id, entry_type, timestamp, notes) VALUES (?, ?, ?, ?)',
             (ctx.author.id, 'entrada', now, notes))
         await db.commit()
+        _presence_track(ctx.author, 'entrada', now)
 
         await ctx.send(embed=_make_clock_embed(
             'entrada', ctx.author, now, 0x2ECC71, ctx.author.mention,
@@ -502,6 +674,7 @@ async def _handle_saida(ctx, notes: Optional[str]):
             'INSERT INTO time_entries (user_id, entry_type, timestamp, notes) VALUES (?, ?, ?, ?)',
             (ctx.author.id, 'saida', now, notes))
         await db.commit()
+        _presence_track(ctx.author, 'saida', now)
 
         await ctx.send(embed=_make_clock_embed(
             'saida', ctx.author, now, 0xE74C3C, ctx.author.mention,
@@ -529,6 +702,7 @@ async def _handle_pausa(ctx, notes: Optional[str]):
             'INSERT INTO time_entries (user_id, entry_type, timestamp, notes) VALUES (?, ?, ?, ?)',
             (ctx.author.id, 'pausa', now, notes))
         await db.commit()
+        _presence_track(ctx.author, 'pausa', now)
 
         await ctx.send(embed=_make_clock_embed(
             'pausa', ctx.author, now, 0x95A5A6, ctx.author.mention,
@@ -558,6 +732,7 @@ async def _handle_retorno(ctx, notes: Optional[str]):
             'INSERT INTO time_entries (user_id, entry_type, timestamp, notes) VALUES (?, ?, ?, ?)',
             (ctx.author.id, 'retorno', now, notes))
         await db.commit()
+        _presence_track(ctx.author, 'retorno', now)
 
         await ctx.send(embed=_make_clock_embed(
             'retorno', ctx.author, now, 0x1ABC9C, ctx.author.mention,
@@ -649,6 +824,219 @@ async def slash_painel(interaction: discord.Interaction):
     await interaction.response.send_message("🧭 **Painel de Ponto** — use os botões abaixo:", view=view)
 
 
+@bot.tree.command(name="quadro", description="Publicar quadro de quem está em jornada ou pausa")
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def slash_quadro(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    try:
+        await _post_dashboard(interaction.channel)
+    except discord.HTTPException as e:
+        await interaction.followup.send(
+            embed=_make_warning_embed("Não foi possível publicar o quadro", f"Verifique minhas permissões neste canal. (`{e}`)"),
+            ephemeral=True
+        )
+        return
+    await interaction.followup.send("👥 Quadro publicado neste canal.", ephemeral=True)
+
+
+# ======================================
+# Diagnóstico: profiler por amostragem + watchdog do event loop
+# ======================================
+PERFIL_INTERVALO = 0.01    # 100 amostras/s — custo desprezível mesmo em produção
+PERFIL_HEARTBEAT = 0.05    # batida do loop usada para medir atraso
+PERFIL_LIMIAR = 0.25       # bloqueio mínimo (s) para registrar a pilha do loop
+PERFIL_MAX_BYTES = 4 * 1024 * 1024  # por anexo; dois anexos cabem no limite de upload do Discord
+
+
+class LoopProfiler:
+    """Amostra as pilhas de todas as threads e detecta bloqueios do event loop.
+
+    Deve ser iniciado de dentro do loop. Uma thread daemon lê
+    ``sys._current_frames()`` a cada ``interval`` segundos e acumula as pilhas
+    no formato *collapsed* (compatível com flamegraph.pl / speedscope). Uma
+    tarefa no loop atualiza um heartbeat; se ele ficar parado além de
+    ``threshold``, a pilha atual do loop é registrada como travamento.
+    """
+
+    def __init__(self, interval: float = PERFIL_INTERVALO, threshold: float = PERFIL_LIMIAR):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: Counter = Counter()
+        self.total_samples = 0
+        self.stalls: List[Tuple[float, str]] = []  # (duração em s, pilha do loop)
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._beat_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._last_beat = time.perf_counter()
+        self._beat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._run, name='perfil-sampler', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._beat_task:
+            self._beat_task.cancel()
+        if self._thread:
+            # join em executor para não bloquear o próprio loop
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+
+    async def _heartbeat(self):
+        while not self._stop.is_set():
+            self._last_beat = time.perf_counter()
+            await asyncio.sleep(PERFIL_HEARTBEAT)
+
+    def _run(self):
+        sampler_id = threading.get_ident()
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            for tid, frame in frames.items():
+                if tid == sampler_id:
+                    continue
+                name = 'event-loop' if tid == self._loop_thread_id else names.get(tid, f'thread-{tid}')
+                self.samples[self._collapse(name, frame)] += 1
+            self.total_samples += 1
+
+            beat = self._last_beat
+            lag = time.perf_counter() - beat - PERFIL_HEARTBEAT
+            if lag > self.threshold:
+                if beat != reported_beat:
+                    reported_beat = beat
+                    frame = frames.get(self._loop_thread_id)
+                    stack = ''.join(traceback.format_stack(frame)) if frame else '(pilha indisponível)\n'
+                    print(f"[PERFIL] Event loop bloqueado há mais de {lag * 1000:.0f} ms:\n{stack}", end='')
+                    self.stalls.append((lag, stack))
+                else:
+                    # mesmo travamento ainda em curso: atualiza a duração
+                    self.stalls[-1] = (lag, self.stalls[-1][1])
+            del frames
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            parts.append(label.replace(';', ':'))
+            frame = frame.f_back
+        parts.append(thread_name.replace(';', ':').replace(' ', '_'))
+        return ';'.join(reversed(parts))
+
+    @staticmethod
+    def _join_limited(chunks, max_bytes: int) -> Tuple[bytes, int]:
+        """Concatena os trechos até ``max_bytes``; retorna o conteúdo e quantos ficaram de fora."""
+        out: List[bytes] = []
+        size = 0
+        for i, chunk in enumerate(chunks):
+            data = chunk.encode('utf-8')
+            if size + len(data) > max_bytes:
+                return b''.join(out), len(chunks) - i
+            out.append(data)
+            size += len(data)
+        return b''.join(out), 0
+
+    def collapsed_bytes(self, max_bytes: int = PERFIL_MAX_BYTES) -> Tuple[bytes, int]:
+        # most_common() primeiro: se cortar, ficam de fora só as pilhas mais raras
+        lines = [f"{stack} {count}\n" for stack, count in self.samples.most_common()]
+        return self._join_limited(lines, max_bytes)
+
+    def stalls_bytes(self, max_bytes: int = PERFIL_MAX_BYTES) -> Tuple[bytes, int]:
+        blocks = [
+            f"#{i} — bloqueio de ~{lag * 1000:.0f} ms\n{stack}\n"
+            for i, (lag, stack) in enumerate(self.stalls, 1)
+        ]
+        return self._join_limited(blocks, max_bytes)
+
+
+_perfil_lock = asyncio.Lock()
+
+
+@bot.tree.command(name="perfil", description="(Admin) Perfila o bot por N segundos e detecta travamentos do loop")
+@app_commands.describe(
+    segundos="Duração da coleta em segundos (padrão: 30)",
+    limiar_ms=f"Bloqueio mínimo do loop, em ms, para registrar a pilha (padrão: {int(PERFIL_LIMIAR * 1000)})"
+)
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+async def slash_perfil(
+    interaction: discord.Interaction,
+    segundos: app_commands.Range[int, 1, 300] = 30,
+    limiar_ms: app_commands.Range[int, 20, 10000] = int(PERFIL_LIMIAR * 1000)
+):
+    if _perfil_lock.locked():
+        await interaction.response.send_message(
+            embed=_make_warning_embed("Perfil em andamento", "Já existe uma coleta rodando. Aguarde ela terminar."),
+            ephemeral=True
+        )
+        return
+
+    async with _perfil_lock:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        profiler = LoopProfiler(threshold=limiar_ms / 1000)
+        profiler.start()
+        print(f"[PERFIL] Coleta iniciada por {interaction.user} ({segundos}s, limiar {limiar_ms} ms).")
+        try:
+            await asyncio.sleep(segundos)
+        finally:
+            await profiler.stop()
+        print(f"[PERFIL] Coleta finalizada: {profiler.total_samples} amostras, {len(profiler.stalls)} travamentos.")
+
+        maior = max((lag for lag, _ in profiler.stalls), default=0.0)
+        folded, folded_omitidas = profiler.collapsed_bytes()
+        stalls, stalls_omitidos = profiler.stalls_bytes()
+        e = discord.Embed(
+            title="🔬 Perfil do bot",
+            description=(
+                f"**Duração:** `{segundos}s`\n"
+                f"**Amostras:** `{profiler.total_samples}` (a cada {int(PERFIL_INTERVALO * 1000)} ms)\n"
+                f"**Travamentos > {limiar_ms} ms:** `{len(profiler.stalls)}`\n"
+                f"**Maior bloqueio:** `{maior * 1000:.0f} ms`"
+            ),
+            color=0x8E44AD
+        )
+        if folded_omitidas:
+            e.add_field(
+                name="✂️ perfil.folded truncado",
+                value=f"`{folded_omitidas}` pilhas menos frequentes omitidas (limite de {PERFIL_MAX_BYTES // (1024 * 1024)} MB).",
+                inline=False
+            )
+        if stalls_omitidos:
+            e.add_field(
+                name="✂️ travamentos.txt truncado",
+                value=f"`{stalls_omitidos}` travamentos omitidos (limite de {PERFIL_MAX_BYTES // (1024 * 1024)} MB).",
+                inline=False
+            )
+        e.set_footer(text="perfil.folded: use flamegraph.pl ou speedscope.app para visualizar.")
+
+        files = [discord.File(io.BytesIO(folded), filename='perfil.folded')]
+        if profiler.stalls:
+            files.append(discord.File(io.BytesIO(stalls), filename='travamentos.txt'))
+        await interaction.followup.send(embed=e, files=files, ephemeral=True)
+
+
+@slash_perfil.error
+async def slash_perfil_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    # Com este handler registrado, o CommandTree.on_error padrão não loga nada:
+    # qualquer erro precisa ser reportado aqui.
+    if isinstance(error, app_commands.MissingPermissions):
+        embed = _make_warning_embed("Sem permissão", "Apenas administradores podem usar `/perfil`.")
+    else:
+        print(f"[ERRO] /perfil: {error}")
+        traceback.print_exception(error)
+        embed = _make_warning_embed("Falha no perfil", f"A coleta não pôde ser concluída. (`{error}`)")
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
 # ======================================
 # Ready + View persistente + Sync de Slash
 # ======================================
@@ -660,6 +1048,10 @@ async def on_ready():
         await setup_database()
         bot.add_view(TimePanel())
         print("[READY] Database ok e View persistente registrada.")
+        await _presence_load()
+        for guild_id in _dashboards:
+            _schedule_dashboard(guild_id, delay=0)
+        print(f"[READY] Quadro: {len(_presence)} usuários em jornada/pausa, {len(_dashboards)} quadro(s).")
     except Exception as e:
         print(f"[ERRO] Ao preparar database/View: {e}")
 